@@ -0,0 +1,270 @@
+# Drain3 log indexing for drain3_server.py
+# Everything an index worker process runs lives here, away from the MCP server wiring,
+# so this module only needs drain3 (and optionally orjson)
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import os, json, time, logging, threading, operator, multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+import queue as queue_module
+from pathlib import Path
+
+from drain3 import TemplateMiner
+from drain3.file_persistence import FilePersistence
+from drain3.template_miner_config import TemplateMinerConfig
+
+try:
+    import orjson  # optional: faster JSONL encoding
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# -----------------------
+# Configuration
+# -----------------------
+SIM_TH = float(os.getenv("DRAIN3_SIM_TH", "0.4"))
+DEPTH = int(os.getenv("DRAIN3_DEPTH", "4"))
+MAX_CHILDREN = int(os.getenv("DRAIN3_MAX_CHILDREN", "100"))
+MAX_CLUSTERS = int(os.getenv("DRAIN3_MAX_CLUSTERS", "0"))
+
+# Stream tuning
+STREAM_FLUSH_EVERY = int(os.getenv("STREAM_FLUSH_EVERY", "500"))  # emit a progress event every N lines
+STREAM_SLEEP = float(os.getenv("STREAM_SLEEP", "0"))              # throttle (seconds) between flushes; 0 = no sleep
+
+# Multi-file indexing: starting worker processes costs about a second, far more than typical
+# CI logs take to mine, so parallelism is opt-in and only used for large enough inputs
+MAX_WORKERS = int(os.getenv("DRAIN3_WORKERS", "1"))                                    # 1 = sequential
+PARALLEL_MIN_BYTES = int(os.getenv("DRAIN3_PARALLEL_MIN_BYTES", str(16 * 1024 * 1024)))  # total input size
+
+_WORKER_POLL_SECONDS = 1.0  # how often index_parallel checks for lost workers while waiting on events
+
+def _build_config() -> TemplateMinerConfig:
+    cfg = TemplateMinerConfig()
+    cfg.drain_sim_th = SIM_TH
+    cfg.drain_depth = DEPTH
+    cfg.drain_max_children = MAX_CHILDREN
+    if MAX_CLUSTERS > 0:
+        cfg.drain_max_clusters = MAX_CLUSTERS
+    # Use default masking configuration from drain3
+    # Custom masking caused serialization errors with dict objects
+    return cfg
+
+# Config only depends on process env read at startup, so every miner shares one instance
+_CFG = _build_config()
+
+def new_miner(snapshot_path: Path) -> TemplateMiner:
+    return TemplateMiner(FilePersistence(str(snapshot_path)), _CFG)
+
+def read_lines(p: Path, encoding="utf-8") -> Iterable[str]:
+    with p.open("r", encoding=encoding, errors="ignore") as f:
+        for ln in f:
+            yield ln.rstrip("\n")
+
+# drain3 LogCluster always defines these (slots), so fetch all three in one C-level call
+cluster_fields = operator.attrgetter("cluster_id", "size", "log_template_tokens")
+join_tokens = " ".join
+
+def clusters_as_dicts(miner: TemplateMiner, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    clusters = getattr(miner.drain, "clusters", []) or []
+    if limit:
+        clusters = list(islice(clusters, limit))  # drain.clusters may be a dict_values view
+    return [
+        {"cluster_id": cid, "size": size, "template": join_tokens(tokens or ())}
+        for cid, size, tokens in map(cluster_fields, clusters)
+    ]
+
+def index_path_for(snapshot_path: Path) -> Path:
+    return snapshot_path.with_suffix(".idx.json")
+
+def write_cluster_index(snapshot_path: Path, clusters: List[Dict[str, Any]]) -> None:
+    """Writes the slim cluster_id/size/template index next to the snapshot (atomically)."""
+    idx = index_path_for(snapshot_path)
+    tmp = idx.with_name(idx.name + ".tmp")
+    try:
+        if orjson is not None:
+            tmp.write_bytes(orjson.dumps(clusters))
+        else:
+            tmp.write_text(json.dumps(clusters, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, idx)
+    except OSError as e:
+        logger.warning("Could not write cluster index %s: %s", idx, e)
+
+def jsonl(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode() + "\n"
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+# -----------------------
+# Indexing
+# -----------------------
+def index_one(path: str, snapshot: Path, encoding: str, max_lines: Optional[int], result: Dict[str, Any],
+              on_saved: Optional[Callable[[Path, TemplateMiner], None]] = None) -> Iterable[str]:
+    """
+    Mines a single log file into snapshot, yielding its JSONL events (start/progress/template/file_summary or error).
+    Fills result with file, ok, processed_lines and cluster_count for the caller's total summary.
+    on_saved(snapshot, miner) runs once the snapshot is written (the server uses it to cache the miner).
+    """
+    p = Path(path).expanduser().resolve()
+    p_str = str(p)
+    result.update({"file": p_str, "ok": False, "processed_lines": 0, "cluster_count": 0})
+    if not p.exists() or not p.is_file():
+        logger.error("File not found: %s", p_str)
+        yield jsonl({"event": "error", "error": f"File not found: {p_str}", "file": p_str})
+        return
+
+    logger.debug("File found: %s", p_str)
+
+    snap_str = str(snapshot)
+    logger.debug("Snapshot path: %s", snap_str)
+    miner = new_miner(snapshot)
+    logger.debug("Template miner created")
+
+    yield jsonl({"event": "start", "file": p_str, "snapshot": snap_str})
+    logger.debug("Started processing file")
+
+    add_log_message = miner.add_log_message  # bound once; called per line
+    lines = read_lines(p, encoding)
+    if max_lines:
+        lines = islice(lines, max_lines)
+    processed = 0
+    # Pull lines in STREAM_FLUSH_EVERY-sized batches so the per-line loop only feeds Drain3;
+    # the line limit and progress bookkeeping run once per batch
+    while True:
+        batch = list(islice(lines, STREAM_FLUSH_EVERY))
+        if not batch:
+            break
+        for ln in batch:
+            if ln and not ln.isspace():
+                add_log_message(ln)
+        processed += len(batch)
+
+        if len(batch) == STREAM_FLUSH_EVERY:
+            yield jsonl({"event": "progress", "file": p_str, "processed": processed})
+            if STREAM_SLEEP > 0:
+                time.sleep(STREAM_SLEEP)
+
+    # Save at end (older Drain3 may auto-save, but we try explicitly)
+    try:
+        miner.save_state("manual_save")
+    except Exception:
+        pass
+    if on_saved is not None:
+        on_saved(snapshot, miner)
+
+    clusters = clusters_as_dicts(miner)
+    write_cluster_index(snapshot, clusters)
+    # Emit clusters as independent events, coalesced into one chunk per STREAM_FLUSH_EVERY
+    # events so large snapshots don't turn into thousands of tiny writes
+    buf: List[str] = []
+    for c in clusters:
+        buf.append(jsonl({"event": "template", "file": p_str, **c}))
+        if len(buf) >= STREAM_FLUSH_EVERY:
+            yield "".join(buf)
+            buf.clear()
+
+    buf.append(jsonl({
+        "event": "file_summary",
+        "file": p_str,
+        "snapshot": snap_str,
+        "processed_lines": processed,
+        "cluster_count": len(clusters),
+    }))
+    yield "".join(buf)
+
+    result.update({"ok": True, "processed_lines": processed, "cluster_count": len(clusters)})
+
+def _index_worker(slot: int, path: str, snapshot: Path, encoding: str, max_lines: Optional[int], queue: Any) -> Dict[str, Any]:
+    """Process-pool entry point: forwards index_one events through queue, then its slot number as sentinel."""
+    result: Dict[str, Any] = {"file": path, "ok": False, "processed_lines": 0, "cluster_count": 0}
+    try:
+        for chunk in index_one(path, snapshot, encoding, max_lines, result):
+            queue.put(chunk)
+    except Exception as e:
+        logger.error("Indexing %s failed: %s", path, e, exc_info=True)
+        queue.put(jsonl({"event": "error", "error": f"Indexing failed: {e}", "file": result["file"]}))
+    finally:
+        queue.put(slot)
+    return result
+
+# Worker pool and event-queue manager, started on the first parallel index and reused afterwards.
+# spawn, not fork: the server is multithreaded, and a forked child could inherit held locks.
+_executor: Optional[ProcessPoolExecutor] = None
+_manager: Optional[Any] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> Tuple[ProcessPoolExecutor, Any]:
+    global _executor, _manager
+    with _pool_lock:
+        ctx = multiprocessing.get_context("spawn")
+        if _manager is None:
+            _manager = ctx.Manager()
+        if _executor is None:
+            logger.info("Starting index worker pool: MAX_WORKERS=%s", MAX_WORKERS)
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=ctx)
+        return _executor, _manager
+
+def _drop_executor(executor: ProcessPoolExecutor) -> None:
+    """Forgets a broken executor so the next parallel index starts fresh workers."""
+    global _executor
+    with _pool_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+def _collect_events(paths: Sequence[str], futures: Sequence[Future], queue: Any, results: List[Dict[str, Any]]) -> Iterable[str]:
+    """
+    Yields worker events as they arrive until every slot has sent its sentinel or its worker was lost,
+    then appends one result per path (in path order) to results.
+    """
+    pending = set(range(len(futures)))
+    while pending:
+        try:
+            chunk = queue.get(timeout=_WORKER_POLL_SECONDS)
+        except queue_module.Empty:
+            # A worker killed before its finally (OOM, segfault) never sends a sentinel;
+            # its future fails with BrokenProcessPool instead
+            for slot in sorted(pending):
+                future = futures[slot]
+                if future.done() and future.exception() is not None:
+                    pending.discard(slot)
+                    file_str = str(Path(paths[slot]).expanduser().resolve())
+                    logger.error("Indexing worker for %s was lost: %s", file_str, future.exception())
+                    yield jsonl({"event": "error", "error": f"Indexing worker lost: {future.exception()}", "file": file_str})
+            continue
+        if isinstance(chunk, int):
+            pending.discard(chunk)
+            continue
+        yield chunk
+
+    for path, future in zip(paths, futures):
+        if future.exception() is None:
+            results.append(future.result())
+        else:
+            file_str = str(Path(path).expanduser().resolve())
+            results.append({"file": file_str, "ok": False, "processed_lines": 0, "cluster_count": 0})
+
+def _submit_all(executor: ProcessPoolExecutor, manager: Any, paths: Sequence[str], snapshots: Sequence[Path],
+                encoding: str, max_lines: Optional[int]) -> Tuple[List[Future], Any]:
+    queue = manager.Queue()
+    futures = [executor.submit(_index_worker, slot, path, snapshot, encoding, max_lines, queue)
+               for slot, (path, snapshot) in enumerate(zip(paths, snapshots))]
+    return futures, queue
+
+def index_parallel(paths: Sequence[str], snapshots: Sequence[Path], encoding: str, max_lines: Optional[int],
+                   results: List[Dict[str, Any]]) -> Iterable[str]:
+    """Indexes files in worker processes, yielding events as they arrive (interleaved across files)."""
+    executor, manager = _get_pool()
+    try:
+        futures, queue = _submit_all(executor, manager, paths, snapshots, encoding, max_lines)
+    except BrokenProcessPool:
+        # A worker died while the pool sat idle; retry once on fresh workers
+        _drop_executor(executor)
+        executor, manager = _get_pool()
+        futures, queue = _submit_all(executor, manager, paths, snapshots, encoding, max_lines)
+
+    yield from _collect_events(paths, futures, queue, results)
+
+    if any(isinstance(f.exception(), BrokenProcessPool) for f in futures):
+        _drop_executor(executor)
@@ -1,22 +1,31 @@
 #!/usr/bin/env python3
 # Drain3 MCP HTTP server — live streaming JSONL
 # Tools: index_file, query_file, list_templates
-# Deps: pip install fastmcp drain3
+# Deps: pip install fastmcp drain3 orjson (orjson optional, falls back to json)
+# Indexing lives in drain3_indexer.py, which must sit next to this script
 from __future__ import annotations
-from typing import Any, Dict, Iterable, List, Optional
-import os, json, time, sys, logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import os, json, sys, logging, threading
+from itertools import islice
+from collections import OrderedDict
 from pathlib import Path
 
 from fastmcp import FastMCP
 from drain3 import TemplateMiner
-from drain3.file_persistence import FilePersistence
-from drain3.template_miner_config import TemplateMinerConfig
+
+from drain3_indexer import (
+    SIM_TH, DEPTH, MAX_CHILDREN, MAX_CLUSTERS, STREAM_FLUSH_EVERY, STREAM_SLEEP, MAX_WORKERS, PARALLEL_MIN_BYTES,
+    orjson, new_miner, cluster_fields, join_tokens, clusters_as_dicts, index_path_for, jsonl,
+    index_one, index_parallel,
+)
 
 # -----------------------
 # Logging Configuration
 # -----------------------
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=getattr(logging, LOG_LEVEL, logging.INFO),
     format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
     stream=sys.stderr
 )
@@ -28,25 +37,25 @@ logger = logging.getLogger(__name__)
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8766"))
 
-logger.info(f"Initializing Drain3 MCP server")
-logger.info(f"Configuration: HOST={HOST}, PORT={PORT}")
+logger.info("Initializing Drain3 MCP server")
+logger.info("Configuration: HOST=%s, PORT=%s", HOST, PORT)
 
 STATE_DIR = Path(os.getenv("STATE_DIR", ".drain3")).resolve()
 STATE_DIR.mkdir(parents=True, exist_ok=True)
-logger.info(f"State directory: {STATE_DIR}")
+logger.info("State directory: %s", STATE_DIR)
+
+logger.info("Drain3 config: SIM_TH=%s, DEPTH=%s, MAX_CHILDREN=%s, MAX_CLUSTERS=%s", SIM_TH, DEPTH, MAX_CHILDREN, MAX_CLUSTERS)
 
-SIM_TH = float(os.getenv("DRAIN3_SIM_TH", "0.4"))
-DEPTH = int(os.getenv("DRAIN3_DEPTH", "4"))
-MAX_CHILDREN = int(os.getenv("DRAIN3_MAX_CHILDREN", "100"))
-MAX_CLUSTERS = int(os.getenv("DRAIN3_MAX_CLUSTERS", "0"))
+logger.info("Stream config: FLUSH_EVERY=%s, SLEEP=%s", STREAM_FLUSH_EVERY, STREAM_SLEEP)
 
-logger.info(f"Drain3 config: SIM_TH={SIM_TH}, DEPTH={DEPTH}, MAX_CHILDREN={MAX_CHILDREN}, MAX_CLUSTERS={MAX_CLUSTERS}")
+BULK_EMIT_MIN = 64  # listings longer than this go out as one chunk
 
-# Stream tuning
-STREAM_FLUSH_EVERY = int(os.getenv("STREAM_FLUSH_EVERY", "500"))  # emit a progress event every N lines
-STREAM_SLEEP = float(os.getenv("STREAM_SLEEP", "0"))              # throttle (seconds) between flushes; 0 = no sleep
+# Miner cache: loaded snapshots kept in memory so repeated queries skip deserialization
+MINER_CACHE_SIZE = int(os.getenv("DRAIN3_MINER_CACHE_SIZE", "32"))  # 0 = disabled
 
-logger.info(f"Stream config: FLUSH_EVERY={STREAM_FLUSH_EVERY}, SLEEP={STREAM_SLEEP}")
+logger.info("Miner cache config: MINER_CACHE_SIZE=%s", MINER_CACHE_SIZE)
+
+logger.info("Index config: MAX_WORKERS=%s, PARALLEL_MIN_BYTES=%s", MAX_WORKERS, PARALLEL_MIN_BYTES)
 
 logger.info("Creating FastMCP instance")
 mcp = FastMCP("drain3-http")
@@ -59,40 +68,107 @@ def _snapshot_path_for(file_path: Path) -> Path:
     safe_stem = file_path.name.replace("/", "_")
     return STATE_DIR / f"{safe_stem}.snapshot.json"
 
-def _build_config() -> TemplateMinerConfig:
-    cfg = TemplateMinerConfig()
-    cfg.drain_sim_th = SIM_TH
-    cfg.drain_depth = DEPTH
-    cfg.drain_max_children = MAX_CHILDREN
-    if MAX_CLUSTERS > 0:
-        cfg.drain_max_clusters = MAX_CLUSTERS
-    # Use default masking configuration from drain3
-    # Custom masking caused serialization errors with dict objects
-    return cfg
-
-def _new_miner(snapshot_path: Path) -> TemplateMiner:
-    return TemplateMiner(FilePersistence(str(snapshot_path)), _build_config())
-
-def _read_lines(p: Path, encoding="utf-8") -> Iterable[str]:
-    with p.open("r", encoding=encoding, errors="ignore") as f:
-        for ln in f:
-            yield ln.rstrip("\n")
-
-def _clusters_as_dicts(miner: TemplateMiner, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+# snapshot path -> (snapshot mtime_ns, miner), least recently used first
+_miner_cache: OrderedDict[str, Tuple[int, TemplateMiner]] = OrderedDict()
+_miner_cache_lock = threading.Lock()
+
+def _get_miner(snapshot_path: Path) -> TemplateMiner:
+    """Returns a read-only miner for the snapshot, reusing a cached one while the file is unchanged."""
+    key = str(snapshot_path)
+    mtime_ns = snapshot_path.stat().st_mtime_ns
+    with _miner_cache_lock:
+        entry = _miner_cache.get(key)
+        if entry is not None and entry[0] == mtime_ns:
+            _miner_cache.move_to_end(key)
+            return entry[1]
+    # Load outside the lock so a large snapshot doesn't stall every other tool call
+    miner = new_miner(snapshot_path)
+    with _miner_cache_lock:
+        _cache_miner(key, mtime_ns, miner)
+    return miner
+
+def _cache_miner(key: str, mtime_ns: int, miner: TemplateMiner) -> None:
+    # Caller must hold _miner_cache_lock
+    if MINER_CACHE_SIZE <= 0:
+        return
+    entry = _miner_cache.get(key)
+    if entry is not None and entry[0] > mtime_ns:
+        return  # a concurrent load already cached a newer snapshot
+    _miner_cache[key] = (mtime_ns, miner)
+    _miner_cache.move_to_end(key)
+    while len(_miner_cache) > MINER_CACHE_SIZE:
+        _miner_cache.popitem(last=False)
+
+def _prime_miner(snapshot_path: Path, miner: TemplateMiner) -> None:
+    """Stores a freshly indexed miner so the next query on its snapshot is served from memory."""
+    if not snapshot_path.exists():
+        return
+    with _miner_cache_lock:
+        _cache_miner(str(snapshot_path), snapshot_path.stat().st_mtime_ns, miner)
+
+def _clusters_as_columns(miner: TemplateMiner, limit: Optional[int] = None) -> Dict[str, List[Any]]:
+    """Same data as clusters_as_dicts, as parallel lists instead of one dict per cluster."""
     clusters = getattr(miner.drain, "clusters", []) or []
     if limit:
-        clusters = clusters[:limit]
-    return [
-        {
-            "cluster_id": getattr(c, "cluster_id", None),
-            "size": getattr(c, "size", None),
-            "template": " ".join(getattr(c, "log_template_tokens", []) or [])
-        }
-        for c in clusters
-    ]
+        clusters = list(islice(clusters, limit))
+    fields = [cluster_fields(c) for c in clusters]
+    return {
+        "cluster_ids": [cid for cid, _, _ in fields],
+        "sizes": [size for _, size, _ in fields],
+        "templates": [join_tokens(tokens or ()) for _, _, tokens in fields],
+    }
+
+def _columns_from_rows(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    return {
+        "cluster_ids": [r["cluster_id"] for r in rows],
+        "sizes": [r["size"] for r in rows],
+        "templates": [r["template"] for r in rows],
+    }
+
+def _read_cluster_index(snapshot_path: Path) -> Optional[List[Dict[str, Any]]]:
+    """Returns the cluster index if it is at least as new as the snapshot, else None."""
+    idx = index_path_for(snapshot_path)
+    try:
+        if idx.stat().st_mtime_ns < snapshot_path.stat().st_mtime_ns:
+            return None
+        data = idx.read_bytes()
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+    except (OSError, ValueError):
+        return None
+
+def _load_clusters(snapshot_path: Path, limit: Optional[int] = None, as_columns: bool = False):
+    """
+    Clusters from the slim index when fresh, falling back to the Drain3 snapshot.
+    Returns a list of cluster dicts, or with as_columns=True the parallel-list form of _clusters_as_columns.
+    """
+    rows = _read_cluster_index(snapshot_path)
+    if rows is None:
+        miner = _get_miner(snapshot_path)
+        return _clusters_as_columns(miner, limit) if as_columns else clusters_as_dicts(miner, limit)
+    if limit:
+        rows = rows[:limit]
+    return _columns_from_rows(rows) if as_columns else rows
+
+def _input_bytes(paths: List[str]) -> int:
+    """Total size of the given files, skipping any that can't be stat'ed (index_one reports those)."""
+    total = 0
+    for path in paths:
+        try:
+            total += Path(path).expanduser().stat().st_size
+        except OSError:
+            pass
+    return total
 
-def _jsonl(obj: Any) -> str:
-    return json.dumps(obj, ensure_ascii=False) + "\n"
+def _emit_events(events: List[Dict[str, Any]]) -> Iterable[str]:
+    """
+    Yields one chunk per event for short listings so they still stream incrementally,
+    and a single joined chunk once there are more than BULK_EMIT_MIN events.
+    """
+    if len(events) > BULK_EMIT_MIN:
+        yield "".join(map(jsonl, events))
+    else:
+        for event in events:
+            yield jsonl(event)
 
 # -----------------------
 # MCP tools (streaming)
@@ -101,7 +177,9 @@ def _jsonl(obj: Any) -> str:
 def index_file(paths: List[str], encoding: str = "utf-8", max_lines: Optional[int] = None):
     """
     Stream-mines templates from one or more log files and persists Drain3 snapshots.
-    Accepts an array of file paths and processes them sequentially as a single operation.
+    Accepts an array of file paths and processes them as a single operation; with more than
+    one file, DRAIN3_WORKERS > 1 and at least DRAIN3_PARALLEL_MIN_BYTES of input, files are
+    mined in parallel worker processes and their events are interleaved (every event carries its "file").
     Yields JSONL lines progressively:
       - {"event":"start", file, snapshot, ...}
       - {"event":"progress", file, processed:<n>}
@@ -113,69 +191,29 @@ def index_file(paths: List[str], encoding: str = "utf-8", max_lines: Optional[in
     if isinstance(paths, str):
         paths = [paths]
     
-    logger.info(f"index_file called: paths={paths}, encoding={encoding}, max_lines={max_lines}")
-    
-    total_files = 0
-    total_lines = 0
-    total_clusters_count = 0
-    failed_files = []
-    
-    for path in paths:
-        p = Path(path).expanduser().resolve()
-        if not p.exists() or not p.is_file():
-            logger.error(f"File not found: {str(p)}")
-            yield _jsonl({"event": "error", "error": f"File not found: {str(p)}", "file": str(p)})
-            failed_files.append(str(p))
-            continue
-        
-        logger.info(f"File found: {str(p)}")
-
-        snapshot = _snapshot_path_for(p)
-        logger.info(f"Snapshot path: {str(snapshot)}")
-        miner = _new_miner(snapshot)
-        logger.info("Template miner created")
-
-        yield _jsonl({"event": "start", "file": str(p), "snapshot": str(snapshot)})
-        logger.info("Started processing file")
-
-        processed = 0
-        for processed, ln in enumerate(_read_lines(p, encoding), start=1):
-            if max_lines and processed > max_lines:
-                processed -= 1  # last increment doesn't count
-                break
-            if ln.strip():
-                miner.add_log_message(ln)
-
-            if processed % STREAM_FLUSH_EVERY == 0:
-                yield _jsonl({"event": "progress", "file": str(p), "processed": processed})
-                if STREAM_SLEEP > 0:
-                    time.sleep(STREAM_SLEEP)
-
-        # Save at end (older Drain3 may auto-save, but we try explicitly)
-        try:
-            miner.save_state("manual_save")
-        except Exception:
-            pass
-
-        clusters = _clusters_as_dicts(miner)
-        # Emit clusters as independent events so consumers can start handling immediately
-        for c in clusters:
-            yield _jsonl({"event": "template", "file": str(p), **c})
-
-        yield _jsonl({
-            "event": "file_summary",
-            "file": str(p),
-            "snapshot": str(snapshot),
-            "processed_lines": processed,
-            "cluster_count": len(clusters),
-        })
-        
-        total_files += 1
-        total_lines += processed
-        total_clusters_count += len(clusters)
+    logger.info("index_file called: paths=%s, encoding=%s, max_lines=%s", paths, encoding, max_lines)
+    
+    results: List[Dict[str, Any]] = []
+    snapshots = [_snapshot_path_for(Path(path).expanduser().resolve()) for path in paths]
+    # Worker startup only pays off for large inputs, and files sharing a snapshot (same name)
+    # must be mined in order, so only fan out when all snapshots are distinct
+    if (len(paths) > 1 and MAX_WORKERS > 1 and len(set(snapshots)) == len(paths)
+            and _input_bytes(paths) >= PARALLEL_MIN_BYTES):
+        yield from index_parallel(paths, snapshots, encoding, max_lines, results)
+    else:
+        for path, snapshot in zip(paths, snapshots):
+            result: Dict[str, Any] = {}
+            yield from index_one(path, snapshot, encoding, max_lines, result, on_saved=_prime_miner)
+            results.append(result)
+
+    succeeded = [r for r in results if r["ok"]]
+    total_files = len(succeeded)
+    total_lines = sum(r["processed_lines"] for r in succeeded)
+    total_clusters_count = sum(r["cluster_count"] for r in succeeded)
+    failed_files = [r["file"] for r in results if not r["ok"]]
     
     # Final summary across all files
-    yield _jsonl({
+    yield jsonl({
         "event": "total_summary",
         "total_files": total_files,
         "total_lines": total_lines,
@@ -189,56 +227,65 @@ def query_file(path: str, text: str):
     Streams a single JSONL event with the match result:
       - {"event":"query", cluster_id, cluster_size, template, ...}
     """
-    logger.info(f"query_file called: path={path}, text_len={len(text)}")
+    logger.info("query_file called: path=%s, text_len=%s", path, len(text))
     p = Path(path).expanduser().resolve()
+    p_str = str(p)
     snapshot = _snapshot_path_for(p)
+    snap_str = str(snapshot)
     if not snapshot.exists():
-        logger.error(f"No snapshot found for {str(p)}")
-        yield _jsonl({"event": "error", "error": f"No snapshot for {str(p)}. Run index_file first.", "file": str(p)})
+        logger.error("No snapshot found for %s", p_str)
+        yield jsonl({"event": "error", "error": f"No snapshot for {p_str}. Run index_file first.", "file": p_str})
         return
     
-    logger.info(f"Snapshot exists: {str(snapshot)}")
+    logger.debug("Snapshot exists: %s", snap_str)
 
-    miner = _new_miner(snapshot)
+    miner = _get_miner(snapshot)
     result = miner.match(text)
     if result is None:
-        yield _jsonl({"event": "query", "file": str(p), "snapshot": str(snapshot),
+        yield jsonl({"event": "query", "file": p_str, "snapshot": snap_str,
                       "cluster_id": None, "cluster_size": None, "template": None})
         return
 
     cluster = result[0]
-    yield _jsonl({
+    yield jsonl({
         "event": "query",
-        "file": str(p),
-        "snapshot": str(snapshot),
+        "file": p_str,
+        "snapshot": snap_str,
         "cluster_id": getattr(cluster, "cluster_id", None),
         "cluster_size": getattr(cluster, "size", None),
         "template": " ".join(getattr(cluster, "log_template_tokens", []) or []),
     })
 
 @mcp.tool()
-def list_templates(path: str, limit: Optional[int] = None):
+def list_templates(path: str, limit: Optional[int] = None, batch: bool = False):
     """
     Streams templates from an existing snapshot:
       - one {"event":"template", ...} per cluster
+        (or, with batch=true, a single {"event":"templates_batch", cluster_ids, sizes, templates})
       - final {"event":"summary", count, ...}
     """
-    logger.info(f"list_templates called: path={path}, limit={limit}")
+    logger.info("list_templates called: path=%s, limit=%s, batch=%s", path, limit, batch)
     p = Path(path).expanduser().resolve()
+    p_str = str(p)
     snapshot = _snapshot_path_for(p)
+    snap_str = str(snapshot)
     if not snapshot.exists():
-        logger.error(f"No snapshot found for {str(p)}")
-        yield _jsonl({"event": "error", "error": f"No snapshot for {str(p)}. Run index_file first.", "file": str(p)})
+        logger.error("No snapshot found for %s", p_str)
+        yield jsonl({"event": "error", "error": f"No snapshot for {p_str}. Run index_file first.", "file": p_str})
         return
     
-    logger.info(f"Snapshot exists: {str(snapshot)}")
+    logger.debug("Snapshot exists: %s", snap_str)
 
-    miner = _new_miner(snapshot)
-    clusters = _clusters_as_dicts(miner, limit)
-    for c in clusters:
-        yield _jsonl({"event": "template", "file": str(p), "snapshot": str(snapshot), **c})
+    if batch:
+        columns = _load_clusters(snapshot, limit, as_columns=True)
+        yield jsonl({"event": "templates_batch", "file": p_str, "snapshot": snap_str, **columns})
+        yield jsonl({"event": "summary", "file": p_str, "snapshot": snap_str, "count": len(columns["cluster_ids"])})
+        return
 
-    yield _jsonl({"event": "summary", "file": str(p), "snapshot": str(snapshot), "count": len(clusters)})
+    clusters = _load_clusters(snapshot, limit)
+    yield from _emit_events([{"event": "template", "file": p_str, "snapshot": snap_str, **c} for c in clusters])
+
+    yield jsonl({"event": "summary", "file": p_str, "snapshot": snap_str, "count": len(clusters)})
 
 @mcp.tool()
 def list_clusters(path: str, limit: Optional[int] = None):
@@ -248,22 +295,22 @@ def list_clusters(path: str, limit: Optional[int] = None):
       - one {"event":"cluster", ...} per cluster
       - final {"event":"summary", count, ...}
     """
-    logger.info(f"list_clusters called: path={path}, limit={limit}")
+    logger.info("list_clusters called: path=%s, limit=%s", path, limit)
     p = Path(path).expanduser().resolve()
+    p_str = str(p)
     snapshot = _snapshot_path_for(p)
+    snap_str = str(snapshot)
     if not snapshot.exists():
-        logger.error(f"No snapshot found for {str(p)}")
-        yield _jsonl({"event": "error", "error": f"No snapshot for {str(p)}. Run index_file first.", "file": str(p)})
+        logger.error("No snapshot found for %s", p_str)
+        yield jsonl({"event": "error", "error": f"No snapshot for {p_str}. Run index_file first.", "file": p_str})
         return
     
-    logger.info(f"Snapshot exists: {str(snapshot)}")
+    logger.debug("Snapshot exists: %s", snap_str)
 
-    miner = _new_miner(snapshot)
-    clusters = _clusters_as_dicts(miner, limit)
-    for c in clusters:
-        yield _jsonl({"event": "cluster", "file": str(p), "snapshot": str(snapshot), **c})
+    clusters = _load_clusters(snapshot, limit)
+    yield from _emit_events([{"event": "cluster", "file": p_str, "snapshot": snap_str, **c} for c in clusters])
 
-    yield _jsonl({"event": "summary", "file": str(p), "snapshot": str(snapshot), "count": len(clusters)})
+    yield jsonl({"event": "summary", "file": p_str, "snapshot": snap_str, "count": len(clusters)})
 
 @mcp.tool()
 def cluster_stats(path: str, cluster_id: int):
@@ -272,17 +319,19 @@ def cluster_stats(path: str, cluster_id: int):
     Returns:
       - {"event":"stats", cluster_id, size, template, frequency, ...}
     """
-    logger.info(f"cluster_stats called: path={path}, cluster_id={cluster_id}")
+    logger.info("cluster_stats called: path=%s, cluster_id=%s", path, cluster_id)
     p = Path(path).expanduser().resolve()
+    p_str = str(p)
     snapshot = _snapshot_path_for(p)
+    snap_str = str(snapshot)
     if not snapshot.exists():
-        logger.error(f"No snapshot found for {str(p)}")
-        yield _jsonl({"event": "error", "error": f"No snapshot for {str(p)}. Run index_file first.", "file": str(p)})
+        logger.error("No snapshot found for %s", p_str)
+        yield jsonl({"event": "error", "error": f"No snapshot for {p_str}. Run index_file first.", "file": p_str})
         return
     
-    logger.info(f"Snapshot exists: {str(snapshot)}")
+    logger.debug("Snapshot exists: %s", snap_str)
 
-    miner = _new_miner(snapshot)
+    miner = _get_miner(snapshot)
     clusters = getattr(miner.drain, "clusters", []) or []
     
     # Find the cluster by ID
@@ -293,7 +342,7 @@ def cluster_stats(path: str, cluster_id: int):
             break
     
     if target_cluster is None:
-        yield _jsonl({"event": "error", "error": f"Cluster {cluster_id} not found", "file": str(p)})
+        yield jsonl({"event": "error", "error": f"Cluster {cluster_id} not found", "file": p_str})
         return
     
     # Calculate statistics
@@ -301,10 +350,10 @@ def cluster_stats(path: str, cluster_id: int):
     template_tokens = getattr(target_cluster, "log_template_tokens", []) or []
     template = " ".join(template_tokens)
     
-    yield _jsonl({
+    yield jsonl({
         "event": "stats",
-        "file": str(p),
-        "snapshot": str(snapshot),
+        "file": p_str,
+        "snapshot": snap_str,
         "cluster_id": cluster_id,
         "size": size,
         "template": template,
@@ -320,24 +369,26 @@ def find_anomalies(path: str, threshold: float = 0.01):
       - {"event":"anomaly", cluster_id, size, template, frequency_pct, ...}
       - {"event":"summary", anomaly_count, total_clusters, ...}
     """
-    logger.info(f"find_anomalies called: path={path}, threshold={threshold}")
+    logger.info("find_anomalies called: path=%s, threshold=%s", path, threshold)
     p = Path(path).expanduser().resolve()
+    p_str = str(p)
     snapshot = _snapshot_path_for(p)
+    snap_str = str(snapshot)
     if not snapshot.exists():
-        logger.error(f"No snapshot found for {str(p)}")
-        yield _jsonl({"event": "error", "error": f"No snapshot for {str(p)}. Run index_file first.", "file": str(p)})
+        logger.error("No snapshot found for %s", p_str)
+        yield jsonl({"event": "error", "error": f"No snapshot for {p_str}. Run index_file first.", "file": p_str})
         return
     
-    logger.info(f"Snapshot exists: {str(snapshot)}")
+    logger.debug("Snapshot exists: %s", snap_str)
 
-    miner = _new_miner(snapshot)
+    miner = _get_miner(snapshot)
     clusters = getattr(miner.drain, "clusters", []) or []
     
     # Calculate total log lines processed
     total_lines = sum(getattr(c, "size", 0) for c in clusters)
     
     if total_lines == 0:
-        yield _jsonl({"event": "summary", "file": str(p), "anomaly_count": 0, "total_clusters": 0})
+        yield jsonl({"event": "summary", "file": p_str, "anomaly_count": 0, "total_clusters": 0})
         return
     
     anomalies = []
@@ -358,13 +409,12 @@ def find_anomalies(path: str, threshold: float = 0.01):
             })
     
     # Stream anomalies
-    for anomaly in anomalies:
-        yield _jsonl({"event": "anomaly", "file": str(p), "snapshot": str(snapshot), **anomaly})
+    yield from _emit_events([{"event": "anomaly", "file": p_str, "snapshot": snap_str, **anomaly} for anomaly in anomalies])
     
-    yield _jsonl({
+    yield jsonl({
         "event": "summary",
-        "file": str(p),
-        "snapshot": str(snapshot),
+        "file": p_str,
+        "snapshot": snap_str,
         "anomaly_count": len(anomalies),
         "total_clusters": len(clusters),
         "threshold_pct": threshold
@@ -381,29 +431,33 @@ def compare_runs(path1: str, path2: str):
       - {"event":"changed", cluster_id, template, old_size, new_size, ...}
       - {"event":"summary", added_count, removed_count, changed_count, ...}
     """
-    logger.info(f"compare_runs called: path1={path1}, path2={path2}")
+    logger.info("compare_runs called: path1=%s, path2=%s", path1, path2)
     
     # Load first file
     p1 = Path(path1).expanduser().resolve()
+    p1_str = str(p1)
     snapshot1 = _snapshot_path_for(p1)
+    snap1_str = str(snapshot1)
     if not snapshot1.exists():
-        logger.error(f"No snapshot found for {str(p1)}")
-        yield _jsonl({"event": "error", "error": f"No snapshot for {str(p1)}. Run index_file first.", "file": str(p1)})
+        logger.error("No snapshot found for %s", p1_str)
+        yield jsonl({"event": "error", "error": f"No snapshot for {p1_str}. Run index_file first.", "file": p1_str})
         return
     
     # Load second file
     p2 = Path(path2).expanduser().resolve()
+    p2_str = str(p2)
     snapshot2 = _snapshot_path_for(p2)
+    snap2_str = str(snapshot2)
     if not snapshot2.exists():
-        logger.error(f"No snapshot found for {str(p2)}")
-        yield _jsonl({"event": "error", "error": f"No snapshot for {str(p2)}. Run index_file first.", "file": str(p2)})
+        logger.error("No snapshot found for %s", p2_str)
+        yield jsonl({"event": "error", "error": f"No snapshot for {p2_str}. Run index_file first.", "file": p2_str})
         return
     
-    logger.info(f"Both snapshots exist: {str(snapshot1)}, {str(snapshot2)}")
+    logger.debug("Both snapshots exist: %s, %s", snap1_str, snap2_str)
 
     # Load miners
-    miner1 = _new_miner(snapshot1)
-    miner2 = _new_miner(snapshot2)
+    miner1 = _get_miner(snapshot1)
+    miner2 = _get_miner(snapshot2)
     
     clusters1 = getattr(miner1.drain, "clusters", []) or []
     clusters2 = getattr(miner2.drain, "clusters", []) or []
@@ -449,19 +503,16 @@ def compare_runs(path1: str, path2: str):
             removed.append(info1)
     
     # Stream results
-    for item in added:
-        yield _jsonl({"event": "added", "file1": str(p1), "file2": str(p2), **item})
+    yield from _emit_events([{"event": "added", "file1": p1_str, "file2": p2_str, **item} for item in added])
     
-    for item in removed:
-        yield _jsonl({"event": "removed", "file1": str(p1), "file2": str(p2), **item})
+    yield from _emit_events([{"event": "removed", "file1": p1_str, "file2": p2_str, **item} for item in removed])
     
-    for item in changed:
-        yield _jsonl({"event": "changed", "file1": str(p1), "file2": str(p2), **item})
+    yield from _emit_events([{"event": "changed", "file1": p1_str, "file2": p2_str, **item} for item in changed])
     
-    yield _jsonl({
+    yield jsonl({
         "event": "summary",
-        "file1": str(p1),
-        "file2": str(p2),
+        "file1": p1_str,
+        "file2": p2_str,
         "added_count": len(added),
         "removed_count": len(removed),
         "changed_count": len(changed),
@@ -477,17 +528,19 @@ def search_pattern(path: str, pattern: str, use_regex: bool = False):
       - {"event":"match", cluster_id, size, template, ...}
       - {"event":"summary", match_count, total_clusters, ...}
     """
-    logger.info(f"search_pattern called: path={path}, pattern={pattern}, use_regex={use_regex}")
+    logger.info("search_pattern called: path=%s, pattern=%s, use_regex=%s", path, pattern, use_regex)
     p = Path(path).expanduser().resolve()
+    p_str = str(p)
     snapshot = _snapshot_path_for(p)
+    snap_str = str(snapshot)
     if not snapshot.exists():
-        logger.error(f"No snapshot found for {str(p)}")
-        yield _jsonl({"event": "error", "error": f"No snapshot for {str(p)}. Run index_file first.", "file": str(p)})
+        logger.error("No snapshot found for %s", p_str)
+        yield jsonl({"event": "error", "error": f"No snapshot for {p_str}. Run index_file first.", "file": p_str})
         return
     
-    logger.info(f"Snapshot exists: {str(snapshot)}")
+    logger.debug("Snapshot exists: %s", snap_str)
 
-    miner = _new_miner(snapshot)
+    miner = _get_miner(snapshot)
     clusters = getattr(miner.drain, "clusters", []) or []
     
     matches = []
@@ -507,7 +560,7 @@ def search_pattern(path: str, pattern: str, use_regex: bool = False):
                         "template": template
                     })
             except re.error as e:
-                yield _jsonl({"event": "error", "error": f"Invalid regex pattern: {str(e)}", "file": str(p)})
+                yield jsonl({"event": "error", "error": f"Invalid regex pattern: {str(e)}", "file": p_str})
                 return
         else:
             if pattern.lower() in template.lower():
@@ -518,13 +571,12 @@ def search_pattern(path: str, pattern: str, use_regex: bool = False):
                 })
     
     # Stream matches
-    for match in matches:
-        yield _jsonl({"event": "match", "file": str(p), "snapshot": str(snapshot), **match})
+    yield from _emit_events([{"event": "match", "file": p_str, "snapshot": snap_str, **match} for match in matches])
     
-    yield _jsonl({
+    yield jsonl({
         "event": "summary",
-        "file": str(p),
-        "snapshot": str(snapshot),
+        "file": p_str,
+        "snapshot": snap_str,
         "match_count": len(matches),
         "total_clusters": len(clusters),
         "pattern": pattern,
@@ -540,9 +592,9 @@ if __name__ == "__main__":
     # For HTTP, run this script directly with Python
     logger.info("="*60)
     logger.info("Starting Drain3 MCP HTTP Server")
-    logger.info(f"Host: {HOST}")
-    logger.info(f"Port: {PORT}")
-    logger.info(f"Transport: http")
+    logger.info("Host: %s", HOST)
+    logger.info("Port: %s", PORT)
+    logger.info("Transport: http")
     logger.info("="*60)
     
     try:
@@ -550,5 +602,5 @@ if __name__ == "__main__":
         mcp.run(transport="http", host=HOST, port=PORT)
         logger.info("mcp.run() completed")
     except Exception as e:
-        logger.error(f"Server failed with exception: {e}", exc_info=True)
+        logger.error("Server failed with exception: %s", e, exc_info=True)
         raise
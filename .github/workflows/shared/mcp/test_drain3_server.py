@@ -1,26 +1,63 @@
 #!/usr/bin/env python3
 """
-Test script for drain3_server.py
+Test script for drain3_server.py and drain3_indexer.py
 Validates the server code without requiring dependencies to be installed.
 """
 import ast
+import itertools
+import json
+import logging
+import operator
+import os
+import queue as queue_module
 import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from types import SimpleNamespace
+
+
+def _load_helpers(names, script="drain3_server.py", **env):
+    """
+    Compiles only the named top-level functions/assignments of script (drain3_server.py or
+    drain3_indexer.py) into a namespace seeded with env, so helper logic can be exercised
+    without fastmcp/drain3.
+    """
+    script_path = Path(__file__).parent / script
+    tree = ast.parse(script_path.read_text())
+    nodes = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name in names:
+            nodes.append(node)
+        elif isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id in names for t in node.targets
+        ):
+            nodes.append(node)
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name) and node.target.id in names:
+            nodes.append(node)
+    module = ast.Module(body=ast.parse("from __future__ import annotations").body + nodes, type_ignores=[])
+    namespace = dict(env)
+    exec(compile(module, str(script_path), "exec"), namespace)
+    return namespace
 
 
 def test_syntax():
-    """Test that the Python file has valid syntax."""
-    script_path = Path(__file__).parent / "drain3_server.py"
-    with open(script_path, "r") as f:
-        code = f.read()
-    
-    try:
-        ast.parse(code)
-        print("✓ Python syntax is valid")
-        return True
-    except SyntaxError as e:
-        print(f"✗ Syntax error: {e}")
-        return False
+    """Test that the Python files have valid syntax."""
+    for script in ("drain3_server.py", "drain3_indexer.py"):
+        script_path = Path(__file__).parent / script
+        with open(script_path, "r") as f:
+            code = f.read()
+
+        try:
+            ast.parse(code)
+        except SyntaxError as e:
+            print(f"✗ Syntax error in {script}: {e}")
+            return False
+    print("✓ Python syntax is valid")
+    return True
 
 
 def test_structure():
@@ -114,6 +151,222 @@ def test_no_invalid_params():
     return True
 
 
+def test_read_lines():
+    """Test that read_lines keeps text-mode newline handling (CRLF and lone CR split lines)."""
+    ns = _load_helpers({"read_lines"}, script="drain3_indexer.py")
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "ci.log"
+        log.write_bytes(b"step1\rstep2\rdone\r\n\nlast")
+        lines = list(ns["read_lines"](log))
+
+    expected = ["step1", "step2", "done", "", "last"]
+    if lines != expected:
+        print(f"✗ read_lines returned {lines!r}, expected {expected!r}")
+        return False
+    print("✓ read_lines splits CR, CRLF and LF line endings")
+    return True
+
+
+def test_new_helpers_present():
+    """Test that list_templates exposes batch and the cache/index helpers exist."""
+    here = Path(__file__).parent
+    functions = {}
+    for script in ("drain3_server.py", "drain3_indexer.py"):
+        tree = ast.parse((here / script).read_text())
+        functions.update({node.name: node for node in tree.body if isinstance(node, ast.FunctionDef)})
+
+    expected_helpers = ["_get_miner", "_clusters_as_columns", "_read_cluster_index", "_load_clusters",
+                        "index_one", "index_parallel", "write_cluster_index"]
+    missing = [name for name in expected_helpers if name not in functions]
+    if missing:
+        print(f"✗ Missing helpers: {missing}")
+        return False
+    print(f"✓ Helpers present: {', '.join(expected_helpers)}")
+
+    # Worker processes import drain3_indexer, so it must not pull in the MCP server stack
+    indexer_tree = ast.parse((here / "drain3_indexer.py").read_text())
+    indexer_imports = [node.module for node in ast.walk(indexer_tree) if isinstance(node, ast.ImportFrom)]
+    indexer_imports += [alias.name for node in ast.walk(indexer_tree) if isinstance(node, ast.Import) for alias in node.names]
+    if any(name and name.split(".")[0] in ("fastmcp", "drain3_server") for name in indexer_imports):
+        print(f"✗ drain3_indexer.py should not import the server stack: {indexer_imports}")
+        return False
+    print("✓ drain3_indexer.py does not import fastmcp")
+
+    list_templates = functions.get("list_templates")
+    params = [arg.arg for arg in list_templates.args.args] if list_templates else []
+    if "batch" not in params:
+        print(f"✗ list_templates is missing the batch parameter: {params}")
+        return False
+    print("✓ list_templates accepts batch")
+    return True
+
+
+def _fake_miner(count):
+    """Miner stand-in whose drain.clusters is a dict_values view, as in drain3 0.9.x."""
+    clusters = {
+        i: SimpleNamespace(cluster_id=i, size=i * 10, log_template_tokens=("tpl", str(i)))
+        for i in range(1, count + 1)
+    }
+    return SimpleNamespace(drain=SimpleNamespace(clusters=clusters.values()))
+
+
+def test_cluster_index_fallback():
+    """Test that list helpers use a fresh .idx.json and fall back to the miner otherwise, honoring limit in both output modes."""
+    loads = []
+    def _get_miner(snapshot_path):
+        loads.append(snapshot_path)
+        return _fake_miner(5)
+
+    indexer = _load_helpers(
+        {"index_path_for", "write_cluster_index", "clusters_as_dicts", "cluster_fields", "join_tokens"},
+        script="drain3_indexer.py",
+        orjson=None, json=json, os=os, islice=itertools.islice, operator=operator,
+        logger=logging.getLogger("test_drain3_server"),
+    )
+    ns = _load_helpers(
+        {"_read_cluster_index", "_load_clusters", "_clusters_as_columns", "_columns_from_rows"},
+        orjson=None, json=json, islice=itertools.islice, _get_miner=_get_miner,
+        **{name: indexer[name] for name in ("index_path_for", "clusters_as_dicts", "cluster_fields", "join_tokens")},
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = Path(tmp) / "app.log.snapshot.json"
+        snapshot.write_text("{}")
+        os.utime(snapshot, ns=(1_000_000_000, 1_000_000_000))
+
+        # Missing index: miner fallback, limit applied to a dict_values view
+        clusters = ns["_load_clusters"](snapshot, 2)
+        if [c["cluster_id"] for c in clusters] != [1, 2] or len(loads) != 1:
+            print(f"✗ Missing index should fall back to the miner with limit, got {clusters}")
+            return False
+        columns = ns["_load_clusters"](snapshot, 2, as_columns=True)
+        if columns["cluster_ids"] != [1, 2] or columns["templates"] != ["tpl 1", "tpl 2"] or len(loads) != 2:
+            print(f"✗ Missing index should fall back to miner columns with limit, got {columns}")
+            return False
+
+        # Fresh index: served without touching the miner
+        indexer["write_cluster_index"](snapshot, [{"cluster_id": 9, "size": 1, "template": "cached"}] * 3)
+        idx = indexer["index_path_for"](snapshot)
+        os.utime(idx, ns=(2_000_000_000, 2_000_000_000))
+        clusters = ns["_load_clusters"](snapshot, 2)
+        if [c["template"] for c in clusters] != ["cached", "cached"] or len(loads) != 2:
+            print(f"✗ Fresh index should be served directly with limit, got {clusters}")
+            return False
+        columns = ns["_load_clusters"](snapshot, 2, as_columns=True)
+        if columns != {"cluster_ids": [9, 9], "sizes": [1, 1], "templates": ["cached", "cached"]} or len(loads) != 2:
+            print(f"✗ Fresh index should be served as columns with limit, got {columns}")
+            return False
+
+        # Stale index (snapshot re-written after it): miner fallback
+        os.utime(snapshot, ns=(3_000_000_000, 3_000_000_000))
+        clusters = ns["_load_clusters"](snapshot)
+        if len(clusters) != 5 or len(loads) != 3:
+            print(f"✗ Stale index should fall back to the miner, got {clusters}")
+            return False
+
+        # Unreadable index: miner fallback
+        idx.write_text("{not json")
+        os.utime(idx, ns=(4_000_000_000, 4_000_000_000))
+        clusters = ns["_load_clusters"](snapshot, 1)
+        if [c["cluster_id"] for c in clusters] != [1] or len(loads) != 4:
+            print(f"✗ Corrupt index should fall back to the miner, got {clusters}")
+            return False
+
+    print("✓ Cluster index is used when fresh and falls back to the miner when missing, stale or corrupt")
+    return True
+
+
+def test_miner_cache_invalidation():
+    """Test that cached miners are reused until the snapshot mtime changes, and evicted LRU-first."""
+    loads = []
+    def new_miner(snapshot_path):
+        loads.append(snapshot_path)
+        return object()
+
+    ns = _load_helpers(
+        {"_miner_cache", "_miner_cache_lock", "_get_miner", "_cache_miner"},
+        OrderedDict=OrderedDict, threading=threading, new_miner=new_miner, MINER_CACHE_SIZE=1,
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        first = Path(tmp) / "a.snapshot.json"
+        second = Path(tmp) / "b.snapshot.json"
+        for snap in (first, second):
+            snap.write_text("{}")
+            os.utime(snap, ns=(1_000_000_000, 1_000_000_000))
+
+        miner = ns["_get_miner"](first)
+        if ns["_get_miner"](first) is not miner or len(loads) != 1:
+            print("✗ Unchanged snapshot should be served from the cache")
+            return False
+
+        os.utime(first, ns=(2_000_000_000, 2_000_000_000))
+        if ns["_get_miner"](first) is miner or len(loads) != 2:
+            print("✗ Changed snapshot mtime should reload the miner")
+            return False
+
+        ns["_get_miner"](second)
+        ns["_get_miner"](first)
+        if len(loads) != 4:
+            print(f"✗ MINER_CACHE_SIZE=1 should evict the older snapshot, loads={len(loads)}")
+            return False
+
+    print("✓ Miner cache reuses unchanged snapshots, reloads on mtime change and evicts LRU")
+    return True
+
+
+def test_collect_events():
+    """Test that parallel indexing forwards interleaved worker events, builds results and survives lost workers."""
+    ns = _load_helpers(
+        {"_collect_events", "jsonl"}, script="drain3_indexer.py",
+        orjson=None, json=json, Path=Path, queue_module=queue_module, _WORKER_POLL_SECONDS=0.05,
+        logger=logging.getLogger("test_drain3_server"),
+    )
+    paths = ["/tmp/a.log", "/tmp/b.log"]
+
+    # Two workers whose events interleave; each ends with its slot number as sentinel
+    events = queue_module.Queue()
+    for chunk in ("a:start", "b:start", "a:summary", 0, "b:summary", 1):
+        events.put(chunk)
+    futures = [Future(), Future()]
+    futures[0].set_result({"file": paths[0], "ok": True, "processed_lines": 3, "cluster_count": 2})
+    futures[1].set_result({"file": paths[1], "ok": True, "processed_lines": 5, "cluster_count": 1})
+    results = []
+    chunks = list(ns["_collect_events"](paths, futures, events, results))
+    if chunks != ["a:start", "b:start", "a:summary", "b:summary"]:
+        print(f"✗ Worker events should be forwarded in arrival order, got {chunks}")
+        return False
+    if [r["processed_lines"] for r in results] != [3, 5] or not all(r["ok"] for r in results):
+        print(f"✗ Results should come from the worker futures in path order, got {results}")
+        return False
+    print("✓ Interleaved worker events are forwarded and results collected per file")
+
+    # Second worker killed before sending its sentinel: reported as an error, not waited on
+    events = queue_module.Queue()
+    for chunk in ("a:start", 0):
+        events.put(chunk)
+    futures = [Future(), Future()]
+    futures[0].set_result({"file": paths[0], "ok": True, "processed_lines": 3, "cluster_count": 2})
+    futures[1].set_exception(BrokenProcessPool("worker killed"))
+    results = []
+    done = threading.Event()
+    collected = []
+    def collect():
+        collected.extend(ns["_collect_events"](paths, futures, events, results))
+        done.set()
+    threading.Thread(target=collect, daemon=True).start()
+    if not done.wait(5):
+        print("✗ A lost worker should not leave parallel indexing waiting for its sentinel")
+        return False
+    errors = [json.loads(c) for c in collected if c.startswith("{")]
+    if len(errors) != 1 or errors[0]["event"] != "error" or errors[0]["file"] != paths[1]:
+        print(f"✗ A lost worker should yield one error event for its file, got {collected}")
+        return False
+    if [r["ok"] for r in results] != [True, False] or results[1]["file"] != paths[1]:
+        print(f"✗ A lost worker's file should be counted as failed, got {results}")
+        return False
+    print("✓ Lost workers are reported as errors and counted as failed")
+    return True
+
+
 def main():
     """Run all tests."""
     print("Testing drain3_server.py...")
@@ -123,6 +376,11 @@ def main():
         ("Syntax validation", test_syntax),
         ("Structure validation", test_structure),
         ("Parameter validation", test_no_invalid_params),
+        ("Line reader behavior", test_read_lines),
+        ("New helper validation", test_new_helpers_present),
+        ("Cluster index fallback", test_cluster_index_fallback),
+        ("Miner cache invalidation", test_miner_cache_invalidation),
+        ("Parallel event collection", test_collect_events),
     ]
     
     results = []